@@ -1,226 +1,375 @@
 import os
+import json
 import time
+import shutil
 import pandas as pd
 import numpy as np
 import yfinance as yf
 from supabase import create_client, Client
 from datetime import datetime, timedelta
 import logging
+from sklearn.preprocessing import StandardScaler
+from ridge import ridge_closed_form, ridge_predict, cross_validate_lambda
+from rolling import rolling_sum, rolling_sum_std
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Supabase Setup
-url: str = os.environ.get("SUPABASE_URL")
-key: str = os.environ.get("SUPABASE_SERVICE_KEY")
-
-if not url or not key:
-    raise ValueError("SUPABASE_URL and SUPABASE_SERVICE_KEY must be set")
-
-supabase: Client = create_client(url, key)
-
 # Constants
 TABLE_NAME = "predictions"
-BATCH_DELAY = 12 # seconds, to stay under 5 calls/min limit of free Polygon tier if used, though we use yfinance here which is more lenient but good to be safe/polite
-# Actually yfinance uses Yahoo API which has rate limits too. 12s is very safe.
+CHUNK_SIZE = 20 # symbols per yf.download request, Yahoo caps how many fit in one URL
+DOWNLOAD_THREADS = 8 # yfinance fetches the symbols of a chunk in parallel
+SP500_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sp500_cache.json")
+SP500_CACHE_TTL = 7 * 24 * 60 * 60 # seconds, refresh the ticker list weekly
+HISTORY_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+FEATURES = ['ret_1d', 'ret_5d', 'ret_10d', 'ret_20d', 'volume', 'volatility', 'fed_funds', 'cpi']
+RIDGE_ALPHAS = np.array([0.1, 1.0, 10.0])
+YAHOO_SYMBOLS_PER_MINUTE = 200 # budget in symbol requests, yf.download makes one per ticker
+INSERT_BATCH_SIZE = 500 # rows per Supabase insert, keeps each request under PostgREST's size cap
+
+def load_cached_tickers():
+    """Load the cached S&P 500 ticker list, or None if there isn't one."""
+    try:
+        with open(SP500_CACHE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_cached_tickers(tickers):
+    """Save the ticker list to the cache, atomically so a crash can't leave a torn file."""
+    tmp_path = SP500_CACHE + ".tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(tickers, f)
+        os.replace(tmp_path, SP500_CACHE)
+    except OSError as e:
+        logging.warning(f"Could not cache tickers: {e}")
 
 def get_sp500_tickers():
-    """Fetch S&P 500 tickers from Wikipedia."""
+    """Fetch S&P 500 tickers from Wikipedia, cached on disk for a week."""
+    # Index membership only changes a few times a year
+    if os.path.exists(SP500_CACHE) and time.time() - os.path.getmtime(SP500_CACHE) < SP500_CACHE_TTL:
+        tickers = load_cached_tickers()
+        if tickers:
+            logging.info(f"Loaded {len(tickers)} tickers from cache.")
+            return tickers
+
     try:
         table = pd.read_html('https://en.wikipedia.org/wiki/List_of_S%26P_500_companies')
         df = table[0]
-        tickers = df['Symbol'].tolist()
         # Clean tickers (replace . with - for yahoo, e.g. BF.B -> BF-B)
-        tickers = [t.replace('.', '-') for t in tickers]
+        tickers = df['Symbol'].str.replace('.', '-', regex=False).tolist()
         logging.info(f"Fetched {len(tickers)} tickers from Wikipedia.")
-        return tickers
     except Exception as e:
         logging.error(f"Error fetching tickers: {e}")
+        # Fall back to the last list we saved, however old
+        tickers = load_cached_tickers()
+        if tickers:
+            logging.info(f"Using {len(tickers)} stale cached tickers.")
+            return tickers
         # Fallback to a small list for testing if wiki fails
         return ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'NVDA']
 
-def fetch_history(ticker):
-    """Fetch last ~100 days of data for a ticker."""
+    # Outside the scrape's try, so a failed write can't discard the fresh list
+    save_cached_tickers(tickers)
+    return tickers
+
+class RateLimiter:
+    """
+    Token bucket allowing `calls` requests per `period` seconds.
+    Unused capacity builds up, so acquire() only sleeps once the
+    request rate actually approaches the limit.
+    """
+    def __init__(self, calls, period):
+        self.capacity = calls
+        self.rate = calls / period # tokens refilled per second
+        self.tokens = float(calls)
+        self.updated = time.monotonic()
+
+    def acquire(self, n=1):
+        """Take n tokens, sleeping until the bucket has refilled enough to cover them."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= n
+        if self.tokens < 0:
+            time.sleep(-self.tokens / self.rate)
+            self.tokens = 0.0
+            self.updated = time.monotonic()
+
+yahoo_limiter = RateLimiter(YAHOO_SYMBOLS_PER_MINUTE, 60)
+
+def clean_history(hist):
+    """Normalize a raw yfinance frame for a single ticker."""
+    # Batched downloads align every symbol on a shared date index,
+    # so days a ticker didn't trade come back as all-NaN rows.
+    hist = hist.dropna(subset=["Close"])
+    if hist.empty:
+        return None
+
+    hist = hist.rename(columns={
+        "Close": "close", 
+        "Volume": "volume", 
+        "Open": "open", 
+        "High": "high", 
+        "Low": "low"
+    })
+    
+    # Ensure index is datetime
+    hist.index = pd.to_datetime(hist.index)
+    return hist
+
+def fetch_history(tickers):
+    """Fetch last ~6 months of data for a chunk of tickers in one request."""
+    histories = {}
     try:
         # Fetch 6 months to be safe for 20-day MA and lags
-        hist = yf.download(ticker, period="6mo", interval="1d", progress=False)
-        if hist.empty:
-            return None
-        
-        # Flatten MultiIndex columns if present (yfinance update)
-        if isinstance(hist.columns, pd.MultiIndex):
-            hist.columns = hist.columns.get_level_values(0)
-            
-        hist = hist.rename(columns={
-            "Close": "close", 
-            "Volume": "volume", 
-            "Open": "open", 
-            "High": "high", 
-            "Low": "low"
-        })
-        
-        # Ensure index is datetime
-        hist.index = pd.to_datetime(hist.index)
-        return hist
+        yahoo_limiter.acquire(len(tickers))
+        data = yf.download(tickers, period="6mo", interval="1d", group_by='ticker',
+                           threads=DOWNLOAD_THREADS, progress=False)
+        if data.empty:
+            return histories
+
+        # group_by='ticker' gives (ticker, field) MultiIndex columns
+        downloaded = set(data.columns.get_level_values(0))
+        for ticker in tickers:
+            if ticker not in downloaded:
+                continue
+            hist = clean_history(data[ticker])
+            if hist is not None:
+                histories[ticker] = hist
     except Exception as e:
-        logging.error(f"Error fetching data for {ticker}: {e}")
-        return None
+        logging.error(f"Error fetching data for {', '.join(tickers)}: {e}")
+    return histories
+
+def prune_history_cache(today):
+    """Delete cached histories from previous days, only today's are ever read."""
+    if not os.path.isdir(HISTORY_CACHE_DIR):
+        return
+    for name in os.listdir(HISTORY_CACHE_DIR):
+        if name != today:
+            shutil.rmtree(os.path.join(HISTORY_CACHE_DIR, name), ignore_errors=True)
+
+def save_history(hist, path):
+    """Write a history to the cache, atomically so a crash can't leave a torn file."""
+    tmp_path = path + ".tmp"
+    try:
+        hist.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        # The download itself is still good, it just gets refetched on a rerun
+        logging.warning(f"Could not cache history at {path}: {e}")
 
-def compute_features(df):
-    """Compute features needed for the model."""
-    df = df.copy()
+def fetch_histories(tickers):
+    """
+    Fetch history for every ticker, CHUNK_SIZE symbols per request.
+    Each download is saved to HISTORY_CACHE_DIR/<today>/<ticker>.parquet,
+    so a rerun on the same day only fetches what is still missing.
+    """
+    today = datetime.now().strftime('%Y-%m-%d')
+    prune_history_cache(today)
+    cache_dir = os.path.join(HISTORY_CACHE_DIR, today)
+    os.makedirs(cache_dir, exist_ok=True)
     
-    # 1. Technical Indicators
-    # SMA 20
-    df['sma_20'] = df['close'].rolling(window=20).mean()
+    histories = {}
+    missing = []
+    for ticker in tickers:
+        path = os.path.join(cache_dir, f"{ticker}.parquet")
+        if not os.path.exists(path):
+            missing.append(ticker)
+            continue
+        try:
+            histories[ticker] = pd.read_parquet(path)
+        except Exception as e:
+            # Unreadable cache file, drop it and download the ticker again
+            logging.warning(f"Discarding unreadable cache file {path}: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            missing.append(ticker)
+    if histories:
+        logging.info(f"Loaded {len(histories)} histories from today's cache.")
     
-    # Volatility (20-day std dev of log returns)
-    df['log_ret'] = np.log(df['close'] / df['close'].shift(1))
-    df['volatility'] = df['log_ret'].rolling(window=20).std()
+    # yf.download keeps its results in module-level state, so chunks are
+    # fetched one after another and the parallelism lives inside each call.
+    for i in range(0, len(missing), CHUNK_SIZE):
+        fetched = fetch_history(missing[i:i + CHUNK_SIZE])
+        for ticker, hist in fetched.items():
+            save_history(hist, os.path.join(cache_dir, f"{ticker}.parquet"))
+        histories.update(fetched)
+    logging.info(f"Fetched history for {len(histories)}/{len(tickers)} tickers.")
+    return histories
+
+def compute_features(histories):
+    """
+    Compute features needed for the model for every ticker at once.
+    Takes the {ticker: history} dict from fetch_histories and returns one
+    frame indexed by (ticker, date) holding FEATURES plus the next-day
+    'target', all backed by a single preallocated float32 array.
+    """
+    # Only close and volume are read, so concatenate just those arrays
+    # rather than copying every OHLCV column into one big frame
+    lengths = [len(h) for h in histories.values()]
+    index = pd.MultiIndex.from_arrays([
+        np.repeat(list(histories.keys()), lengths),
+        np.concatenate([h.index.values for h in histories.values()]),
+    ], names=['ticker', 'date'])
+    close = np.concatenate([h['close'].to_numpy(dtype=np.float64) for h in histories.values()])
+    volume = np.concatenate([h['volume'].to_numpy(dtype=np.float64) for h in histories.values()])
+    # Row where each ticker's block starts
+    starts = np.cumsum([0] + lengths[:-1])
+    
+    feats = np.empty((len(close), len(FEATURES) + 1), dtype=np.float32)
+    
+    # Log returns, none on the first day of each ticker
+    log_ret = np.empty(len(close))
+    log_ret[0] = np.nan
+    log_ret[1:] = np.diff(np.log(close)) # one log pass, no ratio array
+    log_ret[starts] = np.nan
+    # The NaN at each block start restarts the rolling windows,
+    # so they never span two tickers
+    ret_20d, volatility = rolling_sum_std(log_ret, 20)
     
     # Momentum (Lagged Returns)
-    df['ret_1d'] = df['log_ret'] # Current day's return is the input for "1D Momentum"
-    df['ret_5d'] = df['log_ret'].rolling(window=5).sum()
-    df['ret_10d'] = df['log_ret'].rolling(window=10).sum()
-    df['ret_20d'] = df['log_ret'].rolling(window=20).sum()
+    feats[:, 0] = log_ret # Current day's return is the input for "1D Momentum"
+    feats[:, 1] = rolling_sum(log_ret, 5)
+    feats[:, 2] = rolling_sum(log_ret, 10)
+    feats[:, 3] = ret_20d
+    
+    feats[:, 4] = volume
+    
+    # Volatility (20-day std dev of log returns)
+    feats[:, 5] = volatility
     
     # Macro data (Fed Funds, CPI) - Fetching this daily is hard without API.
     # For now, we will use static/placeholder values or fetch from FRED if key exists.
     # To keep it robust for this batch job, we'll use recent values.
     # In a real prod env, we'd fetch these.
     # FEATURE HACK: Use fixed recent values to avoid FRED API dependency failure
-    df['fed_funds'] = 5.33 
-    df['cpi'] = 308.0
+    feats[:, 6] = 5.33
+    feats[:, 7] = 308.0
+    
+    # Target: Log return next day, i.e. the following row's log return.
+    # The last day of each ticker picks up the next block's NaN start.
+    feats[:-1, 8] = log_ret[1:]
+    feats[-1, 8] = np.nan
 
-    return df
+    return pd.DataFrame(feats, index=index, columns=FEATURES + ['target'], copy=False)
 
-def predict_next_day(ticker, df):
+def predict_next_day(df):
     """
-    Predict the log return for the NEXT day.
-    Uses the coefficients from main.py (hardcoded or loaded).
-    For simplicity/robustness in this script, we'll use the coefficients we derived/know.
-    Ideally, this script imports the trained model.
+    Predict the log return for the NEXT day for every ticker.
+    Fits one global Ridge model on the pooled history of all stocks, then
+    scores each ticker's latest row in a single batched matmul.
+    Returns a Series of predicted log returns indexed by ticker.
     """
-    # Load model?
-    # Importing 'main' might trigger FastAPI app run.
-    # We should extract the model training logic or save the model.
-    # For now, let's TRAIN the model on the fly for each stock? 
-    # No, that's too slow and fits on single stock data (overfitting).
-    
     # We need the "Global" model.
-    # Since we don't have a model registry, we'll use the Strategy:
-    # "Train on the fly on the specific stock data?"
-    # No, the main.py trains on the data passed in the request.
-    # The main.py logic is: User sends data -> Train -> Predict.
-    # So yes, we TRAIN on the specific stock's history!
-    # Our API is designed to be "Train-and-Predict".
-    
-    # So we should call our own API?
-    # Or replicate the logic here.
-    # Replicating logic is safer for a batch job (no network dependency on own API).
-    
-    # Logic from main.py:
-    # 1. Train/Test split (80/20)
-    # 2. Standardize
-    # 3. RidgeCV
-    # 4. Predict
-    
-    from sklearn.preprocessing import StandardScaler
-    from sklearn.linear_model import RidgeCV
+    # Training a fresh model per stock fits ~100 rows of a single series
+    # (overfitting) and repeats the CV 500 times. Instead we pool every
+    # stock's history into one training set and fit once.
+    
+    # Replicating logic from main.py is safer for a batch job
+    # (no network dependency on own API):
+    # 1. Standardize
+    # 2. Ridge, λ picked by cross-validation
+    # 3. Predict
     
     # Prepare Data
-    # Target: Log return next day
-    # Features: lags, volume, volatility...
+    # Columns are FEATURES followed by the target (log return next day)
+    values = df.to_numpy()
     
-    df['target'] = np.log(df['close'].shift(-1) / df['close']) # 1 day ahead target
+    # We want to predict for "Tomorrow".
+    # So we train on all available history (up to today-1 target).
+    # The last row of each ticker has features for 'Today', but target is NaN (Tomorrow unknown).
     
-    features = ['ret_1d', 'ret_5d', 'ret_10d', 'ret_20d', 'volume', 'volatility', 'fed_funds', 'cpi']
+    # Training Data: All rows where we have features and target
+    complete = ~np.isnan(values).any(axis=1)
+    if complete.sum() < 50:
+        return pd.Series(dtype=float)
     
-    data = df.dropna().copy()
+    # Features are stored as float32; this is the one upcast, after it
+    # standardization, CV and the final fit all run on these float64 arrays
+    X_train = values[complete, :-1].astype(np.float64)
+    y_train = values[complete, -1].astype(np.float64)
     
-    if len(data) < 50:
-        return None
-        
-    X = data[features].values
-    y = data['target'].values
-    
-    # We want to predict for "Tomorrow".
-    # So we train on all available history (up to today-1 target).
-    # The last row of 'df' has features for 'Today', but target is NaN (Tomorrow unknown).
-    
-    # Training Data: All rows where we have target
-    X_train = X
-    y_train = y
-    
-    # Prediction Input: The very last row (Today)
-    # Re-compute features for the last row (which might have been dropped due to NaN target)
-    last_row = df.iloc[-1]
-    # Check if last_row has valid features (it should, as lags look back)
-    # Only target is missing.
-    if np.isnan(last_row['ret_20d']):
-         return None
+    # Prediction Input: The very last row (Today) of every ticker
+    last_rows = df.groupby(level='ticker', sort=False).tail(1)[FEATURES]
+    # Skip tickers whose last row lacks valid features (too little history)
+    last_rows = last_rows.dropna()
          
-    current_features = last_row[features].values.reshape(1, -1)
+    current_features = last_rows.to_numpy(dtype=np.float64)
     
     # Train
     scaler = StandardScaler()
     X_scaled = scaler.fit_transform(X_train)
     
-    model = RidgeCV(alphas=[0.1, 1.0, 10.0])
-    model.fit(X_scaled, y_train)
+    best_lam = cross_validate_lambda(X_scaled, y_train, RIDGE_ALPHAS)
+    beta, intercept = ridge_closed_form(X_scaled, y_train, best_lam)
     
     # Predict
     curr_scaled = scaler.transform(current_features)
-    pred_log_ret = model.predict(curr_scaled)[0]
+    pred_log_ret = ridge_predict(curr_scaled, beta, intercept)
     
-    return pred_log_ret
+    return pd.Series(pred_log_ret, index=last_rows.index.get_level_values('ticker'))
+
+def get_supabase_client() -> Client:
+    """Supabase Setup, done when the job runs so the module imports without credentials."""
+    url: str = os.environ.get("SUPABASE_URL")
+    key: str = os.environ.get("SUPABASE_SERVICE_KEY")
+
+    if not url or not key:
+        raise ValueError("SUPABASE_URL and SUPABASE_SERVICE_KEY must be set")
+
+    return create_client(url, key)
 
 def run():
+    supabase = get_supabase_client()
     tickers = get_sp500_tickers()
     logging.info(f"Starting batch prediction for {len(tickers)} stocks...")
     
     today = datetime.now().strftime('%Y-%m-%d')
     predictions_made = 0
+    pending = []
     
-    for ticker in tickers:
-        try:
-            # Rate Limit
-            time.sleep(BATCH_DELAY)
-            
-            # Fetch
-            df = fetch_history(ticker)
-            if df is None:
-                continue
-                
-            # Process
-            df = compute_features(df)
-            
-            # Predict
-            pred_log_ret = predict_next_day(ticker, df)
-            if pred_log_ret is None:
-                continue
-                
-            # Store
-            # Predicted Direction: +1 if > 0, -1 if < 0
-            direction = 1 if pred_log_ret > 0 else -1
-            
-            data = {
-                "ticker": ticker,
-                "predicted_date": (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d'), # Next day
-                # Actually, if we run after market close, we confirm the close of TODAY.
-                # And we predict for TOMORROW.
-                "predicted_log_return": float(pred_log_ret),
-                "predicted_direction": direction,
-                "created_at": datetime.now().isoformat()
-            }
-            
-            # Insert into Supabase
-            supabase.table(TABLE_NAME).insert(data).execute()
-            predictions_made += 1
-            logging.info(f"Predicted {ticker}: {pred_log_ret:.5f}")
+    # Fetch
+    histories = fetch_histories(tickers)
+    if not histories:
+        logging.error("No price history downloaded, nothing to predict.")
+        return
+    
+    # Process
+    features = compute_features(histories)
+    
+    # Predict
+    predictions = predict_next_day(features)
+    
+    for ticker, pred_log_ret in predictions.items():
+        # Store
+        # Predicted Direction: +1 if > 0, -1 if < 0
+        direction = 1 if pred_log_ret > 0 else -1
+        
+        data = {
+            "ticker": ticker,
+            "predicted_date": (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d'), # Next day
+            # Actually, if we run after market close, we confirm the close of TODAY.
+            # And we predict for TOMORROW.
+            "predicted_log_return": float(pred_log_ret),
+            "predicted_direction": direction,
+            "created_at": datetime.now().isoformat()
+        }
+        
+        pending.append(data)
+        logging.info(f"Predicted {ticker}: {pred_log_ret:.5f}")
             
+    # Insert into Supabase, one multi-row INSERT per batch
+    for i in range(0, len(pending), INSERT_BATCH_SIZE):
+        rows = pending[i:i + INSERT_BATCH_SIZE]
+        try:
+            supabase.table(TABLE_NAME).insert(rows).execute()
+            predictions_made += len(rows)
         except Exception as e:
-            logging.error(f"Failed to process {ticker}: {e}")
+            logging.error(f"Failed to insert {len(rows)} predictions: {e}")
             
     logging.info(f"Batch complete. Made {predictions_made} predictions.")
 
@@ -3,7 +3,8 @@ from pydantic import BaseModel
 from typing import List, Dict
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import StandardScaler
+from ridge import sufficient_stats, standardized_stats, ridge_from_stats, ridge_predict, cross_validate_lambda
+from rolling import rolling_sum
 
 app = FastAPI()
 
@@ -22,65 +23,49 @@ class PredictionRequest(BaseModel):
     days_ahead: int
 
 
-def ridge_closed_form(X: np.ndarray, y: np.ndarray, lam: float):
+def build_training_matrix(training_data: List[TrainingData], days_ahead: int):
     """
-    Closed-form Ridge Regression: β̂ = (XᵀX + λI)⁻¹ Xᵀy
-    Returns (coefficients, intercept).
-    Assumes X is already standardized.
+    Feature matrix and target for the request's history, sorted by date.
+    Returns (features, target_return, close); rows without a full set of
+    lagged features or a target hold NaN and are dropped by the caller.
+    Columns: ret_1d, ret_5d, ret_10d, ret_20d, volume, volatility, fed_funds, cpi
     """
-    n, p = X.shape
-    # Add intercept by centering y (since X is standardized, mean is 0)
-    y_mean = np.mean(y)
-    y_centered = y - y_mean
-
-    # β̂ = (XᵀX + λI)⁻¹ Xᵀy
-    XtX = X.T @ X                        # (p x p)
-    regularization = lam * np.eye(p)     # λI (p x p)
-    Xty = X.T @ y_centered               # (p x 1)
-    beta = np.linalg.solve(XtX + regularization, Xty)  # More stable than inverse
-
-    intercept = y_mean  # Since X is centered (standardized), intercept = mean(y)
-    return beta, intercept
-
-
-def ridge_predict(X: np.ndarray, beta: np.ndarray, intercept: float):
-    """Predict using Ridge coefficients."""
-    return X @ beta + intercept
-
-
-def cross_validate_lambda(X: np.ndarray, y: np.ndarray, lambdas: list, k: int = 5):
-    """
-    K-fold cross-validation to select the best λ.
-    Returns the λ with the lowest average MSE across folds.
-    """
-    n = len(y)
-    indices = np.arange(n)
-    fold_size = n // k
-    best_lam = lambdas[0]
-    best_mse = float('inf')
-
-    for lam in lambdas:
-        mse_folds = []
-        for fold in range(k):
-            val_start = fold * fold_size
-            val_end = val_start + fold_size if fold < k - 1 else n
-            val_idx = indices[val_start:val_end]
-            train_idx = np.concatenate([indices[:val_start], indices[val_end:]])
-
-            X_tr, X_val = X[train_idx], X[val_idx]
-            y_tr, y_val = y[train_idx], y[val_idx]
-
-            beta, intercept = ridge_closed_form(X_tr, y_tr, lam)
-            y_pred = ridge_predict(X_val, beta, intercept)
-            mse = np.mean((y_val - y_pred) ** 2)
-            mse_folds.append(mse)
-
-        avg_mse = np.mean(mse_folds)
-        if avg_mse < best_mse:
-            best_mse = avg_mse
-            best_lam = lam
-
-    return best_lam
+    # Copy the numeric fields straight into one array, no per-row dicts or DataFrame
+    n = len(training_data)
+    raw = np.empty((n, 5))  # close, volume, volatility, fed_funds, cpi
+    for i, d in enumerate(training_data):
+        raw[i] = (d.close, d.volume, d.volatility, d.fed_funds, d.cpi)
+    order = pd.to_datetime([d.date for d in training_data]).argsort(kind='stable')
+    raw = raw[order]
+    close = raw[:, 0]
+
+    # Feature Engineering: Log Returns & Lagged Features
+    # Log Return = ln(price_t / price_{t-1})
+    log_return = np.empty(n)
+    log_return[0] = np.nan
+    log_return[1:] = np.diff(np.log(close))
+
+    features = np.full((n, 8), np.nan)
+
+    # Lagged Returns (Momentum)
+    # We use PAST returns to predict FUTURE returns, so row t gets the windows ending at t-1
+    features[1:, 0] = log_return[:-1]
+    features[1:, 1] = rolling_sum(log_return, 5)[:-1]
+    features[1:, 2] = rolling_sum(log_return, 10)[:-1]
+    features[1:, 3] = rolling_sum(log_return, 20)[:-1]
+    features[:, 4:] = raw[:, 1:]
+
+    # Target: Log Return over 'days_ahead' period
+    # target = ln(price_{t+days_ahead} / price_t)
+    h = days_ahead
+    target_return = np.full(n, np.nan)
+    if 0 <= h < n:
+        target_return[:n - h] = np.log(close[h:] / close[:n - h])
+    elif -n < h < 0:
+        # A negative horizon looks back, ln(price_{t+days_ahead} / price_t) all the same
+        target_return[-h:] = np.log(close[:n + h] / close[-h:])
+
+    return features, target_return, close
 
 
 @app.get("/")
@@ -91,50 +76,42 @@ def read_root():
 def train_and_predict(request: PredictionRequest):
     try:
         # 1. Prepare Data
-        df = pd.DataFrame([vars(d) for d in request.training_data])
-        df['date'] = pd.to_datetime(df['date'])
-        df = df.sort_values('date').reset_index(drop=True)
-
-        # Feature Engineering: Log Returns & Lagged Features
-        # Log Return = ln(price_t / price_{t-1})
-        df['log_return'] = np.log(df['close'] / df['close'].shift(1))
-
-        # Lagged Returns (Momentum)
-        # We use PAST returns to predict FUTURE returns
-        df['ret_1d'] = df['log_return'].shift(1)
-        df['ret_5d'] = df['log_return'].rolling(5).sum().shift(1)
-        df['ret_10d'] = df['log_return'].rolling(10).sum().shift(1)
-        df['ret_20d'] = df['log_return'].rolling(20).sum().shift(1)
-
-        # Target: Log Return over 'days_ahead' period
-        # target = ln(price_{t+days_ahead} / price_t)
-        df['target_return'] = np.log(df['close'].shift(-request.days_ahead) / df['close'])
+        features, target_return, close = build_training_matrix(request.training_data, request.days_ahead)
 
         # Drop NaN values created by shifting/rolling
-        df = df.dropna()
+        valid = ~np.isnan(features).any(axis=1) & ~np.isnan(target_return)
 
-        if len(df) < 50:
+        if valid.sum() < 50:
             raise HTTPException(status_code=400, detail="Insufficient training data after feature engineering")
 
-        feature_cols = ['ret_1d', 'ret_5d', 'ret_10d', 'ret_20d', 'volume', 'volatility', 'fed_funds', 'cpi']
-
-        X_raw = df[feature_cols].values
-        y_raw = df['target_return'].values
+        X_raw = features[valid]  # row-major copy, as the numba kernels prefer
+        y_raw = target_return[valid]
 
         # 2. Train/Test Split (80/20)
         split_idx = int(len(X_raw) * 0.8)
-        X_train_raw, X_test_raw = X_raw[:split_idx], X_raw[split_idx:]
         y_train, y_test = y_raw[:split_idx], y_raw[split_idx:]
 
         # 3. Standardization
-        scaler = StandardScaler()
-        X_train_scaled = scaler.fit_transform(X_train_raw)
-        X_test_scaled = scaler.transform(X_test_raw)
+        # Raw float64 stats (XᵀX, Xᵀy, ...) for all rows and the test block; the
+        # train block's follow by subtraction. Each model's scaler comes from its
+        # own stats, so the train fit never sees test rows and no fit re-scans X.
+        # The stats are taken on X shifted by its first row so the variances
+        # don't cancel on columns like volume
+        shift = X_raw[0].copy()
+        X_shifted = X_raw - shift
+        stats_all = sufficient_stats(X_shifted, y_raw)
+        stats_test = sufficient_stats(X_shifted[split_idx:], y_test)
+        stats_train = tuple(a - b for a, b in zip(stats_all, stats_test))
+        z_stats_train, mu_train, sd_train = standardized_stats(*stats_train, shift)
+        z_stats_all, mu_all, sd_all = standardized_stats(*stats_all, shift)
+
+        X_train_scaled = (X_raw[:split_idx] - mu_train) / sd_train
+        X_test_scaled = (X_raw[split_idx:] - mu_train) / sd_train
 
         # 4. Cross-validate & Train (Closed-Form Ridge)
-        lambdas = [0.001, 0.01, 0.1, 1.0, 10.0, 100.0, 1000.0]
+        lambdas = np.array([0.001, 0.01, 0.1, 1.0, 10.0, 100.0, 1000.0])
         best_lam = cross_validate_lambda(X_train_scaled, y_train, lambdas, k=5)
-        beta_train, intercept_train = ridge_closed_form(X_train_scaled, y_train, best_lam)
+        beta_train, intercept_train = ridge_from_stats(*z_stats_train, best_lam)
 
         # 5. Metrics (on Test Set)
         # R² on Log Returns (Honest)
@@ -144,27 +121,24 @@ def train_and_predict(request: PredictionRequest):
         r_squared = 1 - (ss_res / ss_tot) if ss_tot > 0 else 0.0
 
         # Hit Rate (Directional Accuracy)
-        # Actual direction is sign of target_return
-        # Predicted direction is sign of predicted_return
-        actual_dir = np.sign(y_test)
-        pred_dir = np.sign(y_pred_test)
-        non_flat = actual_dir != 0
-        if non_flat.sum() > 0:
-            hit_rate = float(np.mean(actual_dir[non_flat] == pred_dir[non_flat]))
+        # A hit is when actual and predicted returns share a sign,
+        # i.e. their product is positive; flat actual days are skipped
+        non_flat = y_test != 0
+        if non_flat.any():
+            hit_rate = float(((y_test * y_pred_test)[non_flat] > 0).mean())
         else:
             hit_rate = 0.0
 
         # 6. Re-fit on ALL data for Final Prediction
-        X_all_scaled = scaler.fit_transform(X_raw)
+        X_all_scaled = (X_raw - mu_all) / sd_all
         best_lam_final = cross_validate_lambda(X_all_scaled, y_raw, lambdas, k=5)
-        beta_final, intercept_final = ridge_closed_form(X_all_scaled, y_raw, best_lam_final)
+        beta_final, intercept_final = ridge_from_stats(*z_stats_all, best_lam_final)
 
         # 7. Predict Next Interval
         # Construct current features vector from request
         # We need to compute the lagged features from the provided training data history
         # simpler approach: use the LAST row of the dataframe we just built
         # effectively predicting for the "next" unknown day
-        last_row = df.iloc[-1]
         
         # We need to construct the input based on the *latest* available data
         # The request.current_features has raw values, but we need derived features (lags)
@@ -178,25 +152,12 @@ def train_and_predict(request: PredictionRequest):
         # Re-construct features for the "current" moment using the raw training data list + current_features
         # Append current_features to the end of the data list to compute rolling stats
         
-        full_data = [vars(d) for d in request.training_data]
-        # Create a temp df to compute features for the latest point
-        # We add the "current" point as the last row
-        current_date_row = {
-            'date': '2100-01-01', # dummy date, doesn't matter
-            'close': request.current_features['close'],
-            'volume': request.current_features['volume'],
-            'sma_20': request.current_features['sma_20'],
-            'volatility': request.current_features['volatility'],
-            'fed_funds': request.current_features['fed_funds'],
-            'cpi': request.current_features['cpi']
-        }
-        full_data.append(current_date_row)
-        
-        df_full = pd.DataFrame(full_data)
-        df_full['log_return'] = np.log(df_full['close'] / df_full['close'].shift(1))
+        # We add the "current" close as the last point of the price history
+        full_close = np.append(close, request.current_features['close'])
+        full_log_return = np.diff(np.log(full_close))
         
         # Compute lags for the very last row (the current moment)
-        current_ret_1d = df_full['log_return'].iloc[-1] # This is return from T-1 to T (today)
+        current_ret_1d = full_log_return[-1] # This is return from T-1 to T (today)
         # Actually ret_1d meant return of previous day.
         # If we are at T, we want return T-1. 
         # The shift(1) in main df meant: at row T, use return from T-1.
@@ -207,7 +168,7 @@ def train_and_predict(request: PredictionRequest):
         # log_return at T = ln(Close_T / Close_T-1)
         # So we need features available at time T.
         # The latest log return we know is ln(CurrentPrice / YesterdayPrice).
-        # This is df_full['log_return'].iloc[-1].
+        # This is full_log_return[-1].
         
         # Wait, if `ret_1d = shift(1)`, then at row T, it uses log_return from T-1.
         # log_return at T-1 is ln(P_{T-1} / P_{T-2}).
@@ -238,20 +199,20 @@ def train_and_predict(request: PredictionRequest):
         # We need the last available values from the sequence.
         
         # Calculate trailing features on full history
-        last_idx = len(df_full) - 1
+        last_idx = len(full_close) - 1
         
         # We need values that WOULD BE at df['ret_XX'].iloc[-1] if we hadn't dropped NaNs
         # In training: ret_1d = log_return.shift(1).
         # So at the "current" prediction time (future T+1 target), we use log_return at T.
-        # T is the last row of df_full.
+        # T is the last point of full_close.
         
         # Current Log Return (today's return)
-        curr_log_ret = df_full['log_return'].iloc[-1]
+        curr_log_ret = full_log_return[-1]
         
         # 5D Return (sum of last 5 log returns)
-        curr_ret_5d = df_full['log_return'].rolling(5).sum().iloc[-1]
-        curr_ret_10d = df_full['log_return'].rolling(10).sum().iloc[-1]
-        curr_ret_20d = df_full['log_return'].rolling(20).sum().iloc[-1]
+        curr_ret_5d = full_log_return[-5:].sum()
+        curr_ret_10d = full_log_return[-10:].sum()
+        curr_ret_20d = full_log_return[-20:].sum()
         
         current_feats_vec = np.array([[
             curr_log_ret,       # ret_1d (latest return)
@@ -265,7 +226,7 @@ def train_and_predict(request: PredictionRequest):
         ]])
         
         # Predict Log Return
-        current_scaled = scaler.transform(current_feats_vec)
+        current_scaled = (current_feats_vec - mu_all) / sd_all
         pred_log_return = ridge_predict(current_scaled, beta_final, intercept_final)[0]
         
         # Convert to Price: P_future = P_current * exp(pred_log_ret)
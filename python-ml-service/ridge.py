@@ -0,0 +1,174 @@
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True)
+def ridge_closed_form(X: np.ndarray, y: np.ndarray, lam: float):
+    """
+    Closed-form Ridge Regression: β̂ = (XᵀX + λI)⁻¹ Xᵀy
+    Returns (coefficients, intercept).
+    Assumes X is already standardized.
+    """
+    XtX, Xty, x_sum, y_sum, n = sufficient_stats(X, y)
+    return ridge_from_stats(XtX, Xty, x_sum, y_sum, n, lam)
+
+
+@njit(cache=True)
+def sufficient_stats(X: np.ndarray, y: np.ndarray):
+    """
+    Sufficient statistics of a data block for Ridge: (XᵀX, Xᵀy, Σx, Σy, n).
+    Stats of disjoint blocks add up, so a subset's stats can be derived
+    from the totals by subtraction instead of re-scanning its rows.
+    They're accumulated in X's dtype; pass float64 for unscaled features.
+    """
+    return X.T @ X, X.T @ y, X.sum(axis=0), y.sum(), len(y)
+
+
+@njit(cache=True)
+def centered_normal_equations(XtX: np.ndarray, Xty: np.ndarray, x_sum: np.ndarray,
+                              y_sum: float, n: int):
+    """
+    Center sufficient statistics: returns (XcᵀXc, Xcᵀyc, mean(x), mean(y)).
+    A subset of standardized rows is not itself mean-zero, so the
+    intercept can't be assumed to be mean(y); centering here handles it.
+    """
+    # The p x p algebra is cheap, so it runs in float64
+    x_mean = x_sum.astype(np.float64) / n
+    y_mean = np.float64(y_sum) / n
+    A = XtX.astype(np.float64) - n * np.outer(x_mean, x_mean)  # XcᵀXc (p x p)
+    c = Xty.astype(np.float64) - n * x_mean * y_mean           # Xcᵀyc
+    return A, c, x_mean, y_mean
+
+
+@njit(cache=True)
+def standardized_stats(XtX: np.ndarray, Xty: np.ndarray, x_sum: np.ndarray,
+                       y_sum: float, n: int, shift: np.ndarray):
+    """
+    Sufficient statistics of Z = (X - mean) / std from those of X - shift,
+    so a block can be standardized with its own mean/std without
+    re-scanning it. shift should be a row of X (e.g. the first): it keeps
+    the one-pass variance from cancelling on large columns like volume.
+    Returns (stats of Z, mean, std). std is the population std and constant
+    columns keep scale 1, like StandardScaler.
+    """
+    A, c, x_mean, y_mean = centered_normal_equations(XtX, Xty, x_sum, y_sum, n)
+    mean = shift + x_mean
+    var = np.diag(A) / n
+    sd = np.sqrt(np.maximum(var, 0.0))
+    eps = np.finfo(np.float64).eps
+    for j in range(len(sd)):
+        # StandardScaler's test for a constant column: var within rounding of 0
+        if var[j] <= n * eps * var[j] + (n * mean[j] * eps) ** 2:
+            sd[j] = 1.0
+
+    ZtZ = A / np.outer(sd, sd)
+    Zty = c / sd
+    return (ZtZ, Zty, np.zeros(len(sd)), np.float64(y_sum), n), mean, sd
+
+
+@njit(cache=True)
+def ridge_from_stats(XtX: np.ndarray, Xty: np.ndarray, x_sum: np.ndarray,
+                     y_sum: float, n: int, lam: float):
+    """
+    Closed-form Ridge from sufficient statistics.
+    Returns (coefficients, intercept), same as ridge_closed_form.
+    """
+    # β̂ = (XcᵀXc + λI)⁻¹ Xcᵀyc
+    A, c, x_mean, y_mean = centered_normal_equations(XtX, Xty, x_sum, y_sum, n)
+    for j in range(len(c)):
+        A[j, j] += lam                       # + λI
+    beta = cho_solve(A, c)                   # A is SPD for λ > 0
+
+    intercept = y_mean - x_mean @ beta
+    return beta, intercept
+
+
+@njit(cache=True)
+def cho_solve(A: np.ndarray, b: np.ndarray):
+    """
+    Solve A x = b for symmetric positive definite A via Cholesky, A = L Lᵀ.
+    Roughly half the work of the LU in np.linalg.solve, and stable for SPD.
+    """
+    L = np.linalg.cholesky(A)
+    p = len(b)
+
+    z = np.empty(p)                      # forward substitution: L z = b
+    for i in range(p):
+        acc = b[i]
+        for j in range(i):
+            acc -= L[i, j] * z[j]
+        z[i] = acc / L[i, i]
+
+    x = np.empty(p)                      # back substitution: Lᵀ x = z
+    for i in range(p - 1, -1, -1):
+        acc = z[i]
+        for j in range(i + 1, p):
+            acc -= L[j, i] * x[j]
+        x[i] = acc / L[i, i]
+    return x
+
+
+@njit(cache=True)
+def ridge_path(XtX: np.ndarray, Xty: np.ndarray, x_sum: np.ndarray,
+               y_sum: float, n: int, lambdas: np.ndarray):
+    """
+    Ridge coefficients for every λ from sufficient statistics and a single
+    eigendecomposition XᵀX = V diag(w) Vᵀ (w are the squared singular
+    values of X):  β̂(λ) = V · diag(1 / (w + λ)) · Vᵀ Xᵀ(y - ȳ)
+    so each extra λ costs O(p²) instead of a new factorization.
+    Returns (coefficients (len(lambdas) x p), intercept).
+    Assumes X is already standardized, like ridge_closed_form did.
+    """
+    y_mean = np.float64(y_sum) / n
+    A = XtX.astype(np.float64)
+    c = Xty.astype(np.float64) - x_sum.astype(np.float64) * y_mean  # Xᵀ(y - ȳ)
+    w, V = np.linalg.eigh(A)
+    Vtc = V.T @ c                                   # (p,)
+
+    betas = (Vtc / (w + lambdas.reshape(-1, 1))) @ V.T  # row i = V · diag(1/(w+λ_i)) · Vᵀc
+    return betas, y_mean
+
+
+@njit(cache=True)
+def ridge_predict(X: np.ndarray, beta: np.ndarray, intercept: float):
+    """Predict using Ridge coefficients."""
+    return X @ beta + intercept
+
+
+@njit(cache=True)
+def cross_validate_lambda(X: np.ndarray, y: np.ndarray, lambdas: np.ndarray, k: int = 5):
+    """
+    K-fold cross-validation to select the best λ.
+    Returns the λ with the lowest average MSE across folds.
+    X is scanned once for its totals; each fold's training stats are the
+    totals minus its validation block, which is a contiguous view, and
+    every λ is scored from one factorization per fold.
+    """
+    n = len(y)
+    fold_size = n // k
+    n_lam = len(lambdas)
+
+    # Fold boundaries, [start, end) of each validation block
+    bounds = np.empty((k, 2), dtype=np.int64)
+    for fold in range(k):
+        bounds[fold, 0] = fold * fold_size
+        bounds[fold, 1] = bounds[fold, 0] + fold_size if fold < k - 1 else n
+
+    XtX, Xty, x_sum, y_sum, _ = sufficient_stats(X, y)
+    mse_total = np.zeros(n_lam)
+
+    for fold in range(k):
+        X_val = X[bounds[fold, 0]:bounds[fold, 1]]
+        y_val = y[bounds[fold, 0]:bounds[fold, 1]]
+
+        # Training stats = totals - validation block: XᵀX_tr = XᵀX - X_valᵀX_val
+        vXtX, vXty, vx_sum, vy_sum, n_val = sufficient_stats(X_val, y_val)
+        betas, intercept = ridge_path(XtX - vXtX, Xty - vXty, x_sum - vx_sum,
+                                      y_sum - vy_sum, n - n_val, lambdas)
+
+        y_pred = ridge_predict(X_val, np.ascontiguousarray(betas.T), intercept)  # (n_val x n_lambdas)
+        for i in range(n_lam):
+            mse_total[i] += np.mean((y_val - y_pred[:, i]) ** 2)
+
+    # argmin keeps the first λ on ties
+    return float(lambdas[np.argmin(mse_total / k)])
@@ -0,0 +1,79 @@
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True)
+def rolling_sum(x: np.ndarray, window: int):
+    """
+    Trailing sum over `window` rows in a single pass.
+    A NaN restarts the window, so with a NaN at the start of each ticker's
+    block one call covers a whole (ticker, date) column.
+    Rows without a full window of valid values are NaN, like pandas.
+    """
+    n = len(x)
+    sums = np.full(n, np.nan)
+    run = 0        # valid values seen since the last NaN
+    total = 0.0
+
+    for i in range(n):
+        xi = x[i]
+        if np.isnan(xi):
+            run = 0
+            total = 0.0
+            continue
+
+        if run < window:
+            run += 1
+            total += xi
+        else:
+            total += xi - x[i - window]  # slide: add new, drop oldest
+
+        if run == window:
+            sums[i] = total
+    return sums
+
+
+@njit(cache=True)
+def rolling_sum_std(x: np.ndarray, window: int):
+    """
+    Trailing sum and sample std (ddof=1) over `window` rows in a single pass.
+    The variance is kept with Welford's update, adding the new value and
+    removing the oldest one each step, so it stays stable without
+    re-scanning the window. NaN handling matches rolling_sum.
+    Returns (sums, stds).
+    """
+    n = len(x)
+    sums = np.full(n, np.nan)
+    stds = np.full(n, np.nan)
+    run = 0
+    total = 0.0
+    mean = 0.0
+    m2 = 0.0       # sum of squared deviations from the mean
+
+    for i in range(n):
+        xi = x[i]
+        if np.isnan(xi):
+            run = 0
+            total = 0.0
+            mean = 0.0
+            m2 = 0.0
+            continue
+
+        if run < window:
+            run += 1
+            total += xi
+            delta = xi - mean
+            mean += delta / run
+            m2 += delta * (xi - mean)
+        else:
+            x_old = x[i - window]
+            total += xi - x_old
+            delta = xi - x_old
+            old_mean = mean
+            mean += delta / window
+            m2 += delta * (xi - mean + x_old - old_mean)
+
+        if run == window:
+            sums[i] = total
+            stds[i] = np.sqrt(max(m2, 0.0) / (window - 1))
+    return sums, stds
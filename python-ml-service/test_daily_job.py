@@ -0,0 +1,236 @@
+import os
+import json
+import time
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+import pandas as pd
+import numpy as np
+from daily_job import (FEATURES, RIDGE_ALPHAS, SP500_CACHE_TTL, RateLimiter, compute_features,
+                       fetch_histories, get_sp500_tickers, predict_next_day)
+from test_ridge import brute_force_lambda
+
+def make_history(n, start_price, seed):
+    """A random-walk price history in the shape fetch_histories returns."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start='2024-01-01', periods=n)
+    close = start_price * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    volume = rng.integers(1e6, 1e7, n).astype(float)
+    return pd.DataFrame({'close': close, 'volume': volume}, index=dates)
+
+class TestComputeFeatures(unittest.TestCase):
+    def setUp(self):
+        # Different lengths and price levels, so a window or target that
+        # crossed from one ticker into the next would show up as a mismatch
+        self.histories = {
+            'AAA': make_history(60, 100.0, seed=1),
+            'BBB': make_history(45, 20.0, seed=2),
+        }
+
+    def expected_features(self, hist):
+        # The per-ticker pandas formulas compute_features replaced
+        log_ret = np.log(hist['close'] / hist['close'].shift(1))
+        return pd.DataFrame({
+            'ret_1d': log_ret,
+            'ret_5d': log_ret.rolling(5).sum(),
+            'ret_10d': log_ret.rolling(10).sum(),
+            'ret_20d': log_ret.rolling(20).sum(),
+            'volume': hist['volume'],
+            'volatility': log_ret.rolling(20).std(),
+            'fed_funds': 5.33,
+            'cpi': 308.0,
+            'target': log_ret.shift(-1),
+        }, index=hist.index)
+
+    def test_matches_per_ticker_pandas(self):
+        histories = self.histories
+        features = compute_features(histories)
+
+        self.assertEqual(list(features.columns), FEATURES + ['target'])
+        self.assertEqual(features.dtypes.unique().tolist(), [np.float32])
+        for ticker, hist in histories.items():
+            got = features.xs(ticker, level='ticker')
+            expected = self.expected_features(hist)
+            pd.testing.assert_index_equal(got.index, expected.index, check_names=False)
+            np.testing.assert_allclose(got.to_numpy(), expected.to_numpy(), rtol=1e-5, atol=1e-7)
+
+    def test_windows_restart_at_ticker_boundary(self):
+        features = compute_features(self.histories)
+
+        second = features.xs('BBB', level='ticker')
+        # No return on a ticker's first day, and no full window until day 21
+        self.assertTrue(np.isnan(second['ret_1d'].iloc[0]))
+        self.assertTrue(second['ret_20d'].iloc[:20].isna().all())
+        self.assertTrue(second['volatility'].iloc[:20].isna().all())
+        self.assertFalse(np.isnan(second['ret_20d'].iloc[20]))
+        # The last day of each ticker has no next-day target
+        self.assertTrue(np.isnan(features.xs('AAA', level='ticker')['target'].iloc[-1]))
+        self.assertTrue(np.isnan(second['target'].iloc[-1]))
+
+class TestPredictNextDay(unittest.TestCase):
+    def setUp(self):
+        self.histories = {ticker: make_history(60 + 5 * i, 50.0 + 10 * i, seed=i)
+                          for i, ticker in enumerate(['AAA', 'BBB', 'CCC', 'DDD'])}
+        # Too short for a 20-day window, so its last row has no valid features
+        self.histories['NEW'] = make_history(15, 30.0, seed=9)
+        self.features = compute_features(self.histories)
+
+    def test_one_prediction_per_valid_ticker(self):
+        predictions = predict_next_day(self.features)
+        self.assertEqual(list(predictions.index), ['AAA', 'BBB', 'CCC', 'DDD'])
+        self.assertFalse(predictions.isna().any())
+
+    def test_matches_numpy_ridge(self):
+        # Plain float64 reference: pool complete rows, standardize, pick λ
+        # by per-fold refits, solve the normal equations, score each last row
+        values = self.features.to_numpy(dtype=np.float64)
+        complete = ~np.isnan(values).any(axis=1)
+        X, y = values[complete, :-1], values[complete, -1]
+        mean, std = X.mean(axis=0), X.std(axis=0)
+        std[std == 0] = 1.0
+        Z = (X - mean) / std
+        lam = brute_force_lambda(Z, y, RIDGE_ALPHAS)
+        beta = np.linalg.solve(Z.T @ Z + lam * np.eye(Z.shape[1]), Z.T @ (y - y.mean()))
+
+        last = self.features.groupby(level='ticker', sort=False).tail(1)[FEATURES].dropna()
+        expected = ((last.to_numpy(dtype=np.float64) - mean) / std) @ beta + y.mean()
+
+        predictions = predict_next_day(self.features)
+        np.testing.assert_allclose(predictions.to_numpy(), expected, rtol=1e-7, atol=1e-10)
+        np.testing.assert_array_equal(np.sign(predictions.to_numpy()), np.sign(expected))
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        # A fake clock that only moves when the limiter sleeps
+        self.now = 0.0
+        self.slept = []
+        def sleep(seconds):
+            self.slept.append(seconds)
+            self.now += seconds
+        patcher = mock.patch.multiple('daily_job.time', monotonic=lambda: self.now, sleep=sleep)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_full_run_sleeps_off_the_overdraft(self):
+        # 503 tickers in 26 chunks of 20, back to back, on a 200/min budget:
+        # the first 200 symbols are free and the other 320 refill at 200/60 per second
+        limiter = RateLimiter(200, 60)
+        for _ in range(26):
+            limiter.acquire(20)
+        self.assertAlmostEqual(sum(self.slept), 320 / (200 / 60))
+        self.assertEqual(len(self.slept), 16)
+
+    def test_no_sleep_within_budget(self):
+        limiter = RateLimiter(200, 60)
+        for _ in range(10):
+            limiter.acquire(20)
+        self.assertEqual(self.slept, [])
+
+    def test_unused_capacity_refills(self):
+        limiter = RateLimiter(200, 60)
+        limiter.acquire(200)
+        self.now += 30  # half a period refills 100 tokens
+        limiter.acquire(100)
+        self.assertEqual(self.slept, [])
+        limiter.acquire(20)
+        self.assertAlmostEqual(sum(self.slept), 20 / (200 / 60))
+
+class TestFetchHistories(unittest.TestCase):
+    TICKERS = ['AAA', 'BBB', 'CCC']
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache_dir = tmp.name
+        self.today = os.path.join(self.cache_dir, datetime.now().strftime('%Y-%m-%d'))
+        self.downloads = []
+        for patcher in (mock.patch('daily_job.HISTORY_CACHE_DIR', self.cache_dir),
+                        mock.patch('daily_job.yf.download', self.fake_download)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def fake_download(self, tickers, **kwargs):
+        # Same shape as yf.download(group_by='ticker'): (ticker, field) columns
+        self.downloads.append(list(tickers))
+        dates = pd.bdate_range(start='2024-01-01', periods=30)
+        return pd.concat({
+            ticker: pd.DataFrame({'Open': 1.0, 'High': 1.0, 'Low': 1.0,
+                                  'Close': np.arange(30.0) + i, 'Volume': 1e6}, index=dates)
+            for i, ticker in enumerate(tickers)
+        }, axis=1)
+
+    def test_rerun_reads_cache_without_downloading(self):
+        first = fetch_histories(self.TICKERS)
+        self.assertEqual(self.downloads, [self.TICKERS])
+        self.assertEqual(sorted(os.listdir(self.today)), ['AAA.parquet', 'BBB.parquet', 'CCC.parquet'])
+
+        second = fetch_histories(self.TICKERS)
+        self.assertEqual(len(self.downloads), 1)
+        for ticker in self.TICKERS:
+            pd.testing.assert_frame_equal(second[ticker], first[ticker], check_freq=False)
+
+    def test_corrupt_file_is_refetched(self):
+        os.makedirs(self.today)
+        with open(os.path.join(self.today, 'BBB.parquet'), 'w') as f:
+            f.write('not parquet')
+
+        with self.assertLogs(level='WARNING'):
+            histories = fetch_histories(['BBB'])
+        self.assertEqual(self.downloads, [['BBB']])
+        self.assertEqual(len(histories['BBB']), 30)
+        # The replacement is a readable file, with no temp file left behind
+        self.assertEqual(os.listdir(self.today), ['BBB.parquet'])
+        self.assertEqual(len(pd.read_parquet(os.path.join(self.today, 'BBB.parquet'))), 30)
+
+    def test_old_dates_are_pruned(self):
+        old = os.path.join(self.cache_dir, '2020-01-01')
+        os.makedirs(old)
+        with open(os.path.join(old, 'AAA.parquet'), 'w') as f:
+            f.write('stale')
+
+        fetch_histories(['AAA'])
+        self.assertEqual(os.listdir(self.cache_dir), [os.path.basename(self.today)])
+
+class TestSp500Tickers(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache_path = os.path.join(tmp.name, 'sp500_cache.json')
+        # The scrape returns Wikipedia's symbols, BF.B style
+        self.read_html = mock.Mock(return_value=[pd.DataFrame({'Symbol': ['AAPL', 'BF.B']})])
+        for patcher in (mock.patch('daily_job.SP500_CACHE', self.cache_path),
+                        mock.patch('daily_job.pd.read_html', self.read_html)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write_cache(self, tickers, age):
+        with open(self.cache_path, 'w') as f:
+            json.dump(tickers, f)
+        mtime = time.time() - age
+        os.utime(self.cache_path, (mtime, mtime))
+
+    def test_fresh_cache_skips_scrape(self):
+        self.write_cache(['MSFT'], age=60)
+        self.assertEqual(get_sp500_tickers(), ['MSFT'])
+        self.read_html.assert_not_called()
+
+    def test_expired_cache_is_refreshed(self):
+        self.write_cache(['MSFT'], age=SP500_CACHE_TTL + 60)
+        self.assertEqual(get_sp500_tickers(), ['AAPL', 'BF-B'])
+        with open(self.cache_path) as f:
+            self.assertEqual(json.load(f), ['AAPL', 'BF-B'])
+
+    def test_failed_scrape_falls_back_to_stale_cache(self):
+        self.write_cache(['MSFT'], age=SP500_CACHE_TTL + 60)
+        self.read_html.side_effect = OSError('no network')
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(get_sp500_tickers(), ['MSFT'])
+
+    def test_unwritable_cache_keeps_fresh_scrape(self):
+        with mock.patch('daily_job.SP500_CACHE', os.path.join(self.cache_path, 'missing', 'c.json')):
+            with self.assertLogs(level='WARNING'):
+                self.assertEqual(get_sp500_tickers(), ['AAPL', 'BF-B'])
+
+if __name__ == '__main__':
+    unittest.main()
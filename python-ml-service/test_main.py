@@ -2,7 +2,86 @@
 import unittest
 import pandas as pd
 import numpy as np
-from main import TrainingData, PredictionRequest, app, train_and_predict
+from sklearn.preprocessing import StandardScaler
+from main import TrainingData, PredictionRequest, app, train_and_predict, build_training_matrix
+from test_ridge import brute_force_lambda
+
+FEATURE_COLS = ['ret_1d', 'ret_5d', 'ret_10d', 'ret_20d', 'volume', 'volatility', 'fed_funds', 'cpi']
+LAMBDAS = [0.001, 0.01, 0.1, 1.0, 10.0, 100.0, 1000.0]
+
+def pandas_features(training_data, days_ahead):
+    """The DataFrame feature engineering train_and_predict used before build_training_matrix."""
+    df = pd.DataFrame([vars(d) for d in training_data])
+    df['date'] = pd.to_datetime(df['date'])
+    df = df.sort_values('date').reset_index(drop=True)
+    df['log_return'] = np.log(df['close'] / df['close'].shift(1))
+    df['ret_1d'] = df['log_return'].shift(1)
+    df['ret_5d'] = df['log_return'].rolling(5).sum().shift(1)
+    df['ret_10d'] = df['log_return'].rolling(10).sum().shift(1)
+    df['ret_20d'] = df['log_return'].rolling(20).sum().shift(1)
+    df['target_return'] = np.log(df['close'].shift(-days_ahead) / df['close'])
+    return df
+
+def ridge_reference(X, y, lam):
+    """The original closed-form fit: X is standardized, so the intercept is mean(y)."""
+    y_mean = np.mean(y)
+    beta = np.linalg.solve(X.T @ X + lam * np.eye(X.shape[1]), X.T @ (y - y_mean))
+    return beta, y_mean
+
+def pandas_reference(request):
+    """The endpoint's response computed the original way: pandas, StandardScaler, per-λ CV."""
+    df = pandas_features(request.training_data, request.days_ahead).dropna()
+    X_raw, y_raw = df[FEATURE_COLS].values, df['target_return'].values
+    split_idx = int(len(X_raw) * 0.8)
+    y_train, y_test = y_raw[:split_idx], y_raw[split_idx:]
+
+    scaler = StandardScaler()
+    X_train = scaler.fit_transform(X_raw[:split_idx])
+    X_test = scaler.transform(X_raw[split_idx:])
+    beta, intercept = ridge_reference(X_train, y_train, brute_force_lambda(X_train, y_train, LAMBDAS))
+    y_pred = X_test @ beta + intercept
+    r_squared = 1 - np.sum((y_test - y_pred) ** 2) / np.sum((y_test - y_test.mean()) ** 2)
+    non_flat = np.sign(y_test) != 0
+    hit_rate = np.mean(np.sign(y_test)[non_flat] == np.sign(y_pred)[non_flat])
+
+    X_all = scaler.fit_transform(X_raw)
+    lam = brute_force_lambda(X_all, y_raw, LAMBDAS)
+    beta, intercept = ridge_reference(X_all, y_raw, lam)
+
+    # Current features from the date-sorted history plus today's close
+    cf = request.current_features
+    full_close = pd.Series(list(pandas_features(request.training_data, 0)['close']) + [cf['close']])
+    log_ret = np.log(full_close / full_close.shift(1))
+    current = np.array([[log_ret.iloc[-1], log_ret.rolling(5).sum().iloc[-1],
+                         log_ret.rolling(10).sum().iloc[-1], log_ret.rolling(20).sum().iloc[-1],
+                         cf['volume'], cf['volatility'], cf['fed_funds'], cf['cpi']]])
+    pred_log_return = (scaler.transform(current) @ beta + intercept)[0]
+    return {
+        "predicted_price": cf['close'] * np.exp(pred_log_return),
+        "r_squared": r_squared,
+        "hit_rate": hit_rate,
+        "lambda_selected": lam,
+    }
+
+def make_request(n, days_ahead, seed, shuffle=False):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start='2023-01-02', periods=n)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    training_data = [TrainingData(
+        date=date.strftime('%Y-%m-%d'),
+        close=c,
+        volume=float(rng.integers(1e6, 1e7)),
+        sma_20=c,
+        volatility=float(rng.uniform(0.1, 0.5)),
+        fed_funds=float(rng.uniform(4, 5)),
+        cpi=300 + 0.01 * i
+    ) for i, (date, c) in enumerate(zip(dates, close))]
+    if shuffle:
+        training_data = [training_data[i] for i in rng.permutation(n)]
+    current_features = {"close": close[-1] * 1.01, "volume": 5e6, "sma_20": close[-1],
+                        "volatility": 0.2, "fed_funds": 4.5, "cpi": 302}
+    return PredictionRequest(training_data=training_data, current_features=current_features,
+                             days_ahead=days_ahead)
 
 class TestStockPredictor(unittest.TestCase):
     def test_hit_rate_logic(self):
@@ -58,5 +137,25 @@ class TestStockPredictor(unittest.TestCase):
         print(f"Test Result Metrics: R2={result['r_squared']:.4f}, HitRate={result['hit_rate']:.4f}")
         self.assertGreater(result['hit_rate'], 0.8)
 
+    def test_features_match_pandas(self):
+        for days_ahead in (1, 5, -1):
+            for shuffle in (False, True):
+                request = make_request(150, days_ahead, seed=3, shuffle=shuffle)
+                features, target_return, close = build_training_matrix(request.training_data, days_ahead)
+                df = pandas_features(request.training_data, days_ahead)
+                np.testing.assert_allclose(features, df[FEATURE_COLS].values, rtol=1e-10, atol=1e-12)
+                np.testing.assert_allclose(target_return, df['target_return'].values, rtol=1e-10, atol=1e-12)
+                np.testing.assert_array_equal(close, df['close'].values)
+
+    def test_response_matches_pandas_reference(self):
+        # Unsorted input and a negative horizon go through the same path
+        for days_ahead, shuffle in ((1, False), (5, True), (-1, False), (-1, True)):
+            request = make_request(150, days_ahead, seed=days_ahead + 10, shuffle=shuffle)
+            result = train_and_predict(request)
+            expected = pandas_reference(request)
+            for key, value in expected.items():
+                self.assertAlmostEqual(result[key], value, delta=1e-6 * max(1.0, abs(value)),
+                                       msg=f"{key}, days_ahead={days_ahead}, shuffle={shuffle}")
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+from ridge import (ridge_closed_form, sufficient_stats, standardized_stats, ridge_from_stats,
+                   cross_validate_lambda)
+
+LAMBDAS = np.array([0.001, 0.01, 0.1, 1.0, 10.0, 100.0, 1000.0])
+
+def solve_centered(X, y, lam):
+    """Reference Ridge fit: center X and y, then np.linalg.solve the normal equations."""
+    x_mean, y_mean = X.mean(axis=0), y.mean()
+    Xc, yc = X - x_mean, y - y_mean
+    beta = np.linalg.solve(Xc.T @ Xc + lam * np.eye(X.shape[1]), Xc.T @ yc)
+    return beta, y_mean - x_mean @ beta
+
+def brute_force_lambda(X, y, lambdas, k=5):
+    """Reference CV: refit every fold for every λ, as cross_validate_lambda did originally."""
+    n = len(y)
+    fold_size = n // k
+    best_lam, best_mse = lambdas[0], float('inf')
+    for lam in lambdas:
+        mse_folds = []
+        for fold in range(k):
+            val_start = fold * fold_size
+            val_end = val_start + fold_size if fold < k - 1 else n
+            train = np.r_[0:val_start, val_end:n]
+            X_tr, y_tr = X[train], y[train]
+            y_mean = y_tr.mean()
+            beta = np.linalg.solve(X_tr.T @ X_tr + lam * np.eye(X.shape[1]), X_tr.T @ (y_tr - y_mean))
+            y_pred = X[val_start:val_end] @ beta + y_mean
+            mse_folds.append(np.mean((y[val_start:val_end] - y_pred) ** 2))
+        if np.mean(mse_folds) < best_mse:
+            best_mse, best_lam = np.mean(mse_folds), lam
+    return best_lam
+
+class TestRidge(unittest.TestCase):
+    def make_data(self, seed, n=200, p=8):
+        # Standardized features with a weak linear signal, like the returns data
+        rng = np.random.default_rng(seed)
+        X = rng.normal(size=(n, p))
+        X = (X - X.mean(axis=0)) / X.std(axis=0)
+        y = X @ rng.normal(0, 0.01, p) + rng.normal(0, 0.02, n) + 0.001
+        return X, y
+
+    def test_ridge_from_stats_matches_solve(self):
+        # A block that isn't mean-zero, like the train rows under the all-data scaler
+        X, y = self.make_data(0)
+        X = X[:150] + 0.3
+        y = y[:150]
+        for lam in LAMBDAS:
+            beta, intercept = ridge_from_stats(*sufficient_stats(X, y), lam)
+            expected_beta, expected_intercept = solve_centered(X, y, lam)
+            np.testing.assert_allclose(beta, expected_beta, rtol=1e-4, atol=1e-7)
+            self.assertAlmostEqual(intercept, expected_intercept, places=6)
+
+    def test_ridge_closed_form_matches_solve(self):
+        X, y = self.make_data(1)
+        for lam in LAMBDAS:
+            beta, intercept = ridge_closed_form(X, y, lam)
+            expected_beta, expected_intercept = solve_centered(X, y, lam)
+            np.testing.assert_allclose(beta, expected_beta, rtol=1e-8, atol=1e-12)
+            self.assertAlmostEqual(intercept, expected_intercept, places=10)
+
+    def test_cross_validate_lambda_matches_brute_force(self):
+        for seed in range(20):
+            X, y = self.make_data(seed, n=80 + 10 * seed)
+            self.assertEqual(cross_validate_lambda(X, y, LAMBDAS, k=5),
+                             brute_force_lambda(X, y, LAMBDAS, k=5))
+
+class TestStandardizedStats(unittest.TestCase):
+    def setUp(self):
+        # Columns: normal, volume-sized, exactly constant, nearly constant
+        rng = np.random.default_rng(0)
+        n = 250
+        self.X = np.column_stack([
+            rng.normal(0.001, 0.02, n),
+            rng.uniform(5e9, 2e10, n),
+            np.full(n, 5.33),
+            300 + rng.normal(0, 1e-6, n),
+        ])
+        self.y = rng.normal(0, 0.02, n)
+
+    def standardized(self, X, y):
+        # Stats are accumulated on X shifted by its first row, as the endpoint does
+        shift = X[0].copy()
+        return standardized_stats(*sufficient_stats(X - shift, y), shift)
+
+    def assert_matches_scaler(self, stats, mean, sd, X, y):
+        scaler = StandardScaler().fit(X)
+        Z = scaler.transform(X)
+        np.testing.assert_allclose(mean, scaler.mean_, rtol=1e-12)
+        np.testing.assert_allclose(sd, scaler.scale_, rtol=1e-7)
+        ZtZ, Zty, z_sum, y_sum, n = stats
+        np.testing.assert_allclose(ZtZ, Z.T @ Z, rtol=1e-6, atol=1e-6 * len(y))
+        np.testing.assert_allclose(Zty, Z.T @ y, rtol=1e-6, atol=1e-8)
+        np.testing.assert_array_equal(z_sum, 0.0)  # Z is centered exactly
+        self.assertAlmostEqual(y_sum, y.sum(), places=12)
+        self.assertEqual(n, len(y))
+
+    def test_matches_standard_scaler(self):
+        stats, mean, sd = self.standardized(self.X, self.y)
+        self.assert_matches_scaler(stats, mean, sd, self.X, self.y)
+
+    def test_constant_columns(self):
+        _, _, sd = self.standardized(self.X, self.y)
+        # Exactly constant keeps scale 1; nearly constant is still scaled
+        self.assertEqual(sd[2], 1.0)
+        self.assertAlmostEqual(sd[3], self.X[:, 3].std(), delta=1e-3 * self.X[:, 3].std())
+
+    def test_train_block_by_subtraction(self):
+        # Test rows drift away from the train rows, so an all-rows scaler
+        # would give visibly different train statistics
+        X, y = self.X.copy(), self.y
+        split = 200
+        X[split:, 0] += 1.0
+        X[split:, 1] *= 3
+        shift = X[0].copy()
+        stats_all = sufficient_stats(X - shift, y)
+        stats_test = sufficient_stats(X[split:] - shift, y[split:])
+        stats_train = tuple(a - b for a, b in zip(stats_all, stats_test))
+
+        stats, mean, sd = standardized_stats(*stats_train, shift)
+        self.assert_matches_scaler(stats, mean, sd, X[:split], y[:split])
+        _, mean_all, sd_all = standardized_stats(*stats_all, shift)
+        self.assertGreater(abs(mean_all[0] - mean[0]), 0.1)
+        self.assertGreater(abs(sd_all[1] / sd[1] - 1), 0.1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+import pandas as pd
+import numpy as np
+from rolling import rolling_sum, rolling_sum_std
+
+class TestRolling(unittest.TestCase):
+    def setUp(self):
+        # A random walk of log returns with a NaN mid-series, which
+        # restarts the window the way a new ticker's block does
+        rng = np.random.default_rng(0)
+        self.x = rng.normal(0, 0.02, 120)
+        self.x[0] = np.nan
+        self.x[57] = np.nan
+
+    def test_rolling_sum_matches_pandas(self):
+        for window in (5, 10, 20):
+            expected = pd.Series(self.x).rolling(window).sum()
+            np.testing.assert_allclose(rolling_sum(self.x, window), expected, rtol=1e-10, atol=1e-12)
+
+    def test_rolling_sum_std_matches_pandas(self):
+        series = pd.Series(self.x)
+        sums, stds = rolling_sum_std(self.x, 20)
+        np.testing.assert_allclose(sums, series.rolling(20).sum(), rtol=1e-10, atol=1e-12)
+        np.testing.assert_allclose(stds, series.rolling(20).std(), rtol=1e-8, atol=1e-12)
+
+    def test_nan_restarts_window(self):
+        # Windows reaching back past the NaN are NaN, like pandas
+        sums, stds = rolling_sum_std(self.x, 20)
+        self.assertTrue(np.isnan(sums[57:57 + 20]).all())
+        self.assertTrue(np.isnan(stds[57:57 + 20]).all())
+        self.assertFalse(np.isnan(sums[57 + 20]))
+
+    def test_constant_window(self):
+        x = np.full(40, 0.01)
+        sums, stds = rolling_sum_std(x, 20)
+        np.testing.assert_allclose(sums[19:], 0.2)
+        # Welford's update keeps a flat window at exactly zero, not a rounding residue
+        np.testing.assert_array_equal(stds[19:], 0.0)
+
+if __name__ == '__main__':
+    unittest.main()